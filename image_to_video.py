@@ -1,6 +1,15 @@
 import os
+import re
 import argparse
-from moviepy.editor import *
+import subprocess
+import threading
+import queue
+import concurrent.futures
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+
+EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
 
 
 def create_video_from_images(
@@ -13,69 +22,291 @@ def create_video_from_images(
         resolution=(1920, 1080),
         audio_file=None
 ):
-    image_files = [f for f in os.listdir(image_folder) if f.lower().endswith(('png', 'jpg', 'jpeg', 'bmp', 'gif'))]
-    image_files.sort()
+    if not os.path.isdir(image_folder):
+        print(f"Image folder not found: {image_folder}")
+        return
+
+    # DirEntry caches stat data, so empty or non-regular files are skipped without opening them
+    with os.scandir(image_folder) as it:
+        entries = sorted(
+            (e for e in it if e.is_file() and e.name.lower().endswith(EXTS) and e.stat().st_size > 0),
+            key=lambda e: natsort(e.name)
+        )
 
-    if not image_files:
+    if not entries:
         print(f"No image files found in {image_folder}")
         return
 
-    total_duration = len(image_files) * duration
-    background = ColorClip(resolution, color=background_color, duration=total_duration)
-    clips = []
+    width, height = resolution
+    frames_per_image = int(duration * fps)
 
-    for i, img_file in enumerate(image_files):
-        img_path = os.path.join(image_folder, img_file)
+    if template == "zoom":
+        # Load the kernel before ffmpeg starts so a missing numba leaves nothing running
         try:
-            img_clip = ImageClip(img_path)
+            render_zoom_frames = zoom_kernel()
         except Exception as e:
-            print(f"Error loading image {img_path}: {e}")
-            continue
+            print(f"Error creating video: {e}")
+            return
 
-        # Calculate maximum possible size while maintaining aspect ratio
-        img_w, img_h = img_clip.size
-        ratio = min(resolution[0] / img_w, resolution[1] / img_h)
-        max_size = (int(img_w * ratio), int(img_h * ratio))
+    # Raw RGB frames are piped straight into ffmpeg instead of being composited by MoviePy
+    command = [
+        'ffmpeg', '-y',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-'
+    ]
+    if audio_file and os.path.exists(audio_file):
+        # Loop the audio and cut it to the length of the video
+        command += ['-stream_loop', '-1', '-i', audio_file, '-c:a', 'aac', '-shortest']
+    # Put the moov atom up front so the MP4 can be streamed without a rewrite
+    command += video_codec_args(max(frames_per_image, 1)) + [
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart', output_file
+    ]
 
-        # Create zoom animation
-        if template == "zoom":
-            # Start at 80% size and zoom to 120% over clip duration
-            zoom_factor = lambda t: 0.8 + (0.4 * (t / duration))
-            img_clip = img_clip.resize(lambda t: zoom_factor(t)).set_position('center')
+    try:
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=1 << 20)
+    except Exception as e:
+        print(f"Error starting ffmpeg: {e}")
+        return
 
-            # Set actual displayed size to handle overflow
-            display_size = (int(max_size[0] * 1.2), int(max_size[1] * 1.2))
-            img_clip = img_clip.resize(display_size)
-        else:
-            img_clip = img_clip.resize(max_size)
+    # A single background buffer is reused for every frame
+    frame = np.zeros((height, width, 3), np.uint8)
+    frame[:] = background_color
+    count = 0
 
-        img_clip = img_clip.set_duration(duration).set_start(i * duration)
-        clips.append(img_clip)
+    if template == "zoom":
+        # Start at 80% size and zoom to 120% over clip duration
+        zoom_scales = (0.8 + 0.4 * np.arange(frames_per_image) / max(frames_per_image - 1, 1)).astype(np.float32)
+        zoom_frames = np.empty((max(min(fps, frames_per_image), 1), height, width, 3), np.uint8)
+        background = np.array(background_color, np.uint8)
 
-    video = CompositeVideoClip([background] + clips, size=resolution)
+    # Decode, compose and encoder writes run as three stages joined by bounded queues
+    image_paths = [e.path for e in entries]
+    read_q = queue.Queue(maxsize=4)
+    write_q = queue.Queue(maxsize=fps * 2)
+    write_errors = []
+    stop_reading = threading.Event()
+    reader = threading.Thread(target=read_images, args=(image_paths, resolution, read_q, stop_reading), daemon=True)
+    reader.start()
+    writer = threading.Thread(target=write_frames, args=(proc.stdin, write_q, write_errors), daemon=True)
+    writer.start()
 
-    if audio_file and os.path.exists(audio_file):
-        try:
-            audio = AudioFileClip(audio_file)
-            if audio.duration < video.duration:
-                audio = audio.fx(vfx.loop, duration=video.duration)
+    try:
+        print(f"Creating video with {len(entries)} images")
+        # Stop composing as soon as the writer fails, e.g. because ffmpeg exited early
+        while not write_errors:
+            future = read_q.get()
+            if future is None:
+                break
+            pixels = future.result()
+            if pixels is None:
+                continue
+
+            if template == "zoom":
+                # Render a batch of frames at a time so memory stays bounded
+                for start in range(0, frames_per_image, len(zoom_frames)):
+                    if write_errors:
+                        break
+                    batch = zoom_frames[:frames_per_image - start]
+                    render_zoom_frames(pixels, batch, zoom_scales[start:start + len(batch)], background)
+                    for zoom_frame in batch:
+                        write_q.put(zoom_frame.tobytes())
             else:
-                audio = audio.subclip(0, video.duration)
-            video = video.set_audio(audio)
-        except Exception as e:
-            print(f"Error adding audio: {e}")
+                # The image is static, so render it once and repeat the same bytes
+                blit_centered(frame, pixels, background_color)
+                frame_bytes = frame.tobytes()
+                for _ in range(frames_per_image):
+                    write_q.put(frame_bytes)
+            count += 1
 
-    try:
-        print(f"Creating video with {len(clips)} images")
-        video.write_videofile(
-            output_file,
-            fps=fps,
-            codec='libx264',
-            audio_codec='aac' if audio_file else None
-        )
-        print(f"Video saved as {output_file}")
+        write_q.put(None)
+        writer.join()
+        try:
+            proc.stdin.close()
+        except OSError:
+            # ffmpeg has already exited; its exit code below explains why
+            pass
+
+        if proc.wait() != 0:
+            print(f"Error creating video: ffmpeg exited with code {proc.returncode}")
+            return
+        if write_errors:
+            raise write_errors[0]
+        print(f"Video saved as {output_file} ({count} images)")
     except Exception as e:
+        proc.kill()
+        proc.wait()
         print(f"Error creating video: {e}")
+    finally:
+        # Release the reader and writer threads even when composing stopped early
+        stop_reading.set()
+        reader.join()
+        if writer.is_alive():
+            write_q.put(None)
+            writer.join()
+
+
+def read_images(image_paths, resolution, read_q, stop):
+    """Queue futures of decoded images in order; the bounded queue limits how many are in flight.
+
+    Returns early, cancelling pending decodes, once stop is set.
+    """
+    # Decoding releases the GIL, so several images are loaded concurrently
+    ex = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+    try:
+        for img_path in image_paths:
+            future = ex.submit(load_and_resize, img_path, resolution)
+            # Poll so a consumer that stopped early can't leave this thread blocked on a full queue
+            while not stop.is_set():
+                try:
+                    read_q.put(future, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set():
+                return
+        read_q.put(None)
+    finally:
+        # Queued futures are still needed unless the consumer gave up
+        ex.shutdown(cancel_futures=stop.is_set())
+
+
+def write_frames(stream, write_q, errors):
+    """Write queued frame bytes to stream until a None sentinel, recording the first write error."""
+    while True:
+        frame_bytes = write_q.get()
+        if frame_bytes is None:
+            break
+        # Keep draining after a failure so the producer never blocks on a full queue
+        if not errors:
+            try:
+                stream.write(frame_bytes)
+            except Exception as e:
+                errors.append(e)
+
+
+def natsort(name):
+    """Sort key that orders embedded numbers numerically, so img2 comes before img10."""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', name)]
+
+
+@lru_cache(maxsize=None)
+def nvenc_available():
+    """Probe once whether h264_nvenc can encode on this machine.
+
+    ffmpeg lists h264_nvenc whenever it was built with it, even without an NVIDIA GPU
+    or driver, so a one-frame test encode is the only reliable check.
+    """
+    command = [
+        'ffmpeg', '-hide_banner', '-f', 'lavfi', '-i', 'color=s=256x256',
+        '-frames:v', '1', '-c:v', 'h264_nvenc', '-f', 'null', '-'
+    ]
+    try:
+        return subprocess.run(command, capture_output=True).returncode == 0
+    except Exception:
+        return False
+
+
+def video_codec_args(gop_size):
+    """Return ffmpeg video encoder arguments, preferring NVENC when it actually works here.
+
+    gop_size is the keyframe interval in frames, normally one image's duration.
+    """
+    if nvenc_available():
+        return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-g', str(gop_size)]
+
+    # Slideshows favour encode speed over compression ratio, and frames within one
+    # image barely change, so B-frames and extra reference frames buy nothing.
+    # -threads 0 lets libx264 size its thread pool to every available core
+    return [
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'stillimage', '-crf', '23',
+        '-threads', '0',
+        '-g', str(gop_size), '-keyint_min', str(gop_size), '-bf', '0', '-refs', '1'
+    ]
+
+
+def load_and_resize(img_path, resolution):
+    """Decode an image and fit it inside resolution, returning None if it cannot be loaded."""
+    try:
+        image = Image.open(img_path).convert('RGB')
+    except Exception as e:
+        print(f"Error loading image {img_path}: {e}")
+        return None
+
+    # Calculate maximum possible size while maintaining aspect ratio
+    img_w, img_h = image.size
+    ratio = min(resolution[0] / img_w, resolution[1] / img_h)
+    max_size = (int(img_w * ratio), int(img_h * ratio))
+    return np.asarray(image.resize(max_size, Image.BILINEAR))
+
+
+@lru_cache(maxsize=None)
+def zoom_kernel():
+    """Return the Numba-compiled zoom renderer.
+
+    numba is only imported for the zoom template, and cache=True stores the compiled
+    kernel on disk so later runs skip the JIT compile.
+    """
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def render_zoom_frames(image, out, scales, background):
+        """Render frames into out, each showing image bilinearly scaled by scales[k] and centered."""
+        n_frames, frame_h, frame_w = out.shape[:3]
+        in_h, in_w = image.shape[:2]
+        for k in prange(n_frames):
+            out_w = max(int(in_w * scales[k]), 1)
+            out_h = max(int(in_h * scales[k]), 1)
+            # Offsets of the scaled image inside the frame (negative when it overflows)
+            x0 = (frame_w - out_w) // 2
+            y0 = (frame_h - out_h) // 2
+            step_x = in_w / out_w
+            step_y = in_h / out_h
+
+            for y in range(frame_h):
+                iy = y - y0
+                if iy < 0 or iy >= out_h:
+                    for x in range(frame_w):
+                        for c in range(3):
+                            out[k, y, x, c] = background[c]
+                    continue
+
+                src_y = min(max((iy + 0.5) * step_y - 0.5, 0.0), in_h - 1.0)
+                top = int(src_y)
+                bottom = min(top + 1, in_h - 1)
+                fy = src_y - top
+
+                for x in range(frame_w):
+                    ix = x - x0
+                    if ix < 0 or ix >= out_w:
+                        for c in range(3):
+                            out[k, y, x, c] = background[c]
+                        continue
+
+                    src_x = min(max((ix + 0.5) * step_x - 0.5, 0.0), in_w - 1.0)
+                    left = int(src_x)
+                    right = min(left + 1, in_w - 1)
+                    fx = src_x - left
+                    for c in range(3):
+                        upper = image[top, left, c] * (1 - fx) + image[top, right, c] * fx
+                        lower = image[bottom, left, c] * (1 - fx) + image[bottom, right, c] * fx
+                        out[k, y, x, c] = np.uint8(upper * (1 - fy) + lower * fy + 0.5)
+
+    return render_zoom_frames
+
+
+def blit_centered(frame, image, background_color):
+    """Paint the background and paste image centered on frame, cropping any overflow."""
+    frame_h, frame_w = frame.shape[:2]
+    img_h, img_w = image.shape[:2]
+    frame[:] = background_color
+
+    # Offsets of the image inside the frame (negative when it overflows)
+    x = (frame_w - img_w) // 2
+    y = (frame_h - img_h) // 2
+    fx, fy = max(x, 0), max(y, 0)
+    ix, iy = max(-x, 0), max(-y, 0)
+    w = min(img_w - ix, frame_w - fx)
+    h = min(img_h - iy, frame_h - fy)
+    frame[fy:fy + h, fx:fx + w] = image[iy:iy + h, ix:ix + w]
 
 
 # Keep the main() function from previous version unchanged
@@ -108,4 +339,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
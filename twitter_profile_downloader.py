@@ -1,65 +1,74 @@
 import os
 import re
-import requests
 import json
-import time
-from PIL import Image, ImageDraw
+import asyncio
+import aiohttp
+import numpy as np
+from PIL import Image
 import argparse
-from urllib.parse import urlparse
 from io import BytesIO
+from functools import lru_cache
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/jpeg,image/png,*/*',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
 
+# Matches a bare username, @username, or a twitter.com / x.com profile URL; the username
+# must end at a delimiter so other URLs never yield their scheme as a username
+USERNAME_RE = re.compile(r'^(?:@|(?:https?://)?(?:[A-Za-z0-9-]+\.)?(?:twitter|x)\.com/)?([A-Za-z0-9_]+)(?=[/?#]|$)')
+PROFILE_IMG_RE = re.compile(rb"https://pbs\.twimg\.com/profile_images/[^\"'\s]+")
+
+# Per-request timeout for every HTTP call
+TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Responses smaller than this are placeholders rather than real avatars
+MIN_IMAGE_BYTES = 1000
+# Upper bound on bytes read from a response that does not send Content-Length
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Caps open connections and usernames in flight; each username uses one connection at a time
+MAX_CONCURRENCY = 32
+# How many usernames may start per second, independent of the connection pool size
+RATE_LIMIT_PER_SECOND = 32
+
+
+@lru_cache(maxsize=None)
 def extract_username(text):
     """Extract the username from a Twitter/X URL or @username format."""
-    # Check if it's a URL
-    if "twitter.com/" in text or "x.com/" in text:
-        # Extract username from URL
-        parsed = urlparse(text)
-        path_parts = parsed.path.strip('/').split('/')
-        if path_parts:
-            return path_parts[0]
-    # Check if it's in @username format
-    elif text.startswith('@'):
-        return text[1:]
-    # Already a username
-    else:
-        return text
-
-
-def download_profile_image(username):
-    """Download profile image for a given username."""
+    match = USERNAME_RE.match(text.strip())
+    return match.group(1) if match else text
+
+
+async def download_profile_image(username, session):
+    """Download profile image for a given username using the given aiohttp session."""
     try:
         # Twitter now requires a different approach
         # We'll try a direct access to the profile image URL
         # This is more reliable than scraping the HTML
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'image/avif,image/webp,image/jpeg,image/png,*/*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': f'https://twitter.com/{username}'
-        }
+        headers = {'Referer': f'https://twitter.com/{username}'}
 
         # First try the "syndication" API which doesn't require authentication
         syn_url = f"https://syndication.twitter.com/srv/timeline-profile/screen-name/{username}"
-        response = requests.get(syn_url, headers=headers)
+        async with session.get(syn_url, headers=headers) as response:
+            content = await response.read() if response.status == 200 else None
 
-        if response.status_code == 200:
-            content = response.text
-            # Look for profile image URL pattern
-            profile_image_pattern = r"https://pbs.twimg.com/profile_images/[^\"'\s]+"
-            match = re.search(profile_image_pattern, content)
+        if content:
+            # Look for profile image URL pattern in the raw body to avoid decoding it
+            match = PROFILE_IMG_RE.search(content)
 
             if match:
-                image_url = match.group(0)
+                image_url = match.group(0).decode('ascii')
                 # Replace _normal with _400x400 for higher resolution
                 image_url = image_url.replace("_normal", "_400x400")
 
                 # Download the image
-                img_response = requests.get(image_url, headers=headers)
-                if img_response.status_code == 200:
-                    print(f"Successfully found image via syndication API for @{username}")
-                    return img_response.content
+                async with session.get(image_url, headers=headers) as img_response:
+                    if img_response.status == 200:
+                        print(f"Successfully found image via syndication API for @{username}")
+                        return await img_response.read()
 
         # If that fails, try direct URL construction
         # This works because Twitter profile images follow a predictable pattern
@@ -67,23 +76,23 @@ def download_profile_image(username):
 
         # Try to access their API endpoint directly
         api_url = f"https://api.twitter.com/1.1/users/show.json?screen_name={username}"
-        response = requests.get(api_url, headers=headers)
+        async with session.get(api_url, headers=headers) as response:
+            text = await response.text() if response.status == 200 else ''
 
-        if response.status_code == 200 and 'profile_image_url_https' in response.text:
-            data = response.json()
+        if 'profile_image_url_https' in text:
+            data = json.loads(text)
             image_url = data.get('profile_image_url_https', '').replace('_normal', '_400x400')
             if image_url:
-                img_response = requests.get(image_url, headers=headers)
-                if img_response.status_code == 200:
-                    return img_response.content
+                async with session.get(image_url, headers=headers) as img_response:
+                    if img_response.status == 200:
+                        return await img_response.read()
 
         # Last resort: Try with nitter.net (a Twitter alternative frontend)
         print(f"Trying nitter.net for @{username}...")
         nitter_url = f"https://nitter.net/{username}/pic"
-        response = requests.get(nitter_url, headers=headers, allow_redirects=True)
-
-        if response.status_code == 200:
-            return response.content
+        async with session.get(nitter_url, headers=headers, allow_redirects=True) as response:
+            if response.status == 200:
+                return await response.read()
 
         print(f"Could not download profile image for @{username}")
         return None
@@ -92,37 +101,30 @@ def download_profile_image(username):
         return None
 
 
-def make_rounded_image(image_data, output_path):
+@lru_cache(maxsize=None)
+def circle_mask(height, width):
+    """Return an antialiased circular alpha mask; cached since most profile images are 400x400."""
+    y, x = np.ogrid[:height, :width]
+    cy, cx = height / 2, width / 2
+    radius = min(height, width) / 2
+    dist = np.sqrt((x + 0.5 - cx) ** 2 + (y + 0.5 - cy) ** 2)
+    return np.clip((radius - dist + 0.5) * 255, 0, 255).astype(np.uint8)
+
+
+def make_rounded_image(image_data, output_path, compress_level=1):
     """Convert image to rounded shape with transparency."""
     try:
         # Open the image from bytes
-        try:
-            image = Image.open(requests.io.BytesIO(image_data))
-        except:
-            # If that fails, try direct file handling
-            with open("temp_image", "wb") as f:
-                f.write(image_data)
-            image = Image.open("temp_image")
-
-        # Convert to RGBA if it's not already
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-
-        # Create a circular mask
-        mask = Image.new('L', image.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0, image.size[0], image.size[1]), fill=255)
+        image = Image.open(BytesIO(image_data))
 
-        # Apply the mask to the image
-        result = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        result.paste(image, (0, 0), mask)
+        # Apply an antialiased circular mask to the alpha channel
+        pixels = np.asarray(image.convert('RGBA')).copy()
+        height, width = pixels.shape[:2]
+        pixels[..., 3] = np.minimum(pixels[..., 3], circle_mask(height, width))
+        result = Image.fromarray(pixels)
 
-        # Save the result
-        result.save(output_path, 'PNG')
-
-        # Clean up temp file if it exists
-        if os.path.exists("temp_image"):
-            os.remove("temp_image")
+        # Save the result; low zlib levels encode much faster for a small size increase
+        result.save(output_path, 'PNG', optimize=False, compress_level=compress_level)
 
         return True
     except Exception as e:
@@ -130,23 +132,46 @@ def make_rounded_image(image_data, output_path):
         return False
 
 
-def process_usernames(input_file, output_dir):
-    """Process each username in the input file."""
-    # Create output directory if it doesn't exist
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # Read usernames from file
-    with open(input_file, 'r') as file:
-        usernames = [line.strip() for line in file if line.strip()]
-
-    successful = 0
-    failed = 0
-
-    # Process each username
-    for username in usernames:
+async def fetch_image(session, url):
+    """Stream an image from url, returning its bytes or None if the response is rejected."""
+    async with session.get(url) as response:
+        if response.status != 200:
+            return None
+
+        # Reject placeholders from the headers alone, before reading the body
+        content_length = response.content_length
+        if content_length is not None:
+            if content_length <= MIN_IMAGE_BYTES:
+                return None
+            return await response.read()
+
+        chunks = []
+        total = 0
+        async for chunk in response.content.iter_chunked(8192):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total > MAX_IMAGE_BYTES:
+                return None
+
+        if total <= MIN_IMAGE_BYTES:
+            return None
+        return b''.join(chunks)
+
+
+async def fetch_and_save(username, output_dir, session, rate_limit, concurrency, compress_level=1):
+    """Download and save the rounded profile image for one already-extracted username.
+
+    Returns (True, None) on success or (False, error message) on failure.
+    """
+    # Hold a concurrency slot for the whole username so requests never queue for a
+    # pooled connection long enough to hit the timeout before being sent
+    async with concurrency:
+        clean_username = username
         try:
-            clean_username = extract_username(username)
+            # Each token is handed back one second after it is taken, bounding the overall request rate
+            await rate_limit.acquire()
+            asyncio.get_running_loop().call_later(1, rate_limit.release)
+
             print(f"Processing @{clean_username}...")
 
             # Try using a direct method to get profile image
@@ -157,41 +182,73 @@ def process_usernames(input_file, output_dir):
 
             try:
                 # Try to download with unavatar.io service
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                img_response = requests.get(direct_url, headers=headers, timeout=10)
+                image_data = await fetch_image(session, direct_url)
 
-                if img_response.status_code == 200 and len(img_response.content) > 1000:
-                    image_data = img_response.content
+                if image_data:
                     print(f"✅ Got image using unavatar.io for @{clean_username}")
                 else:
                     # If that fails, try the more complex method
                     print(f"Unavatar method failed, trying backup method...")
-                    image_data = download_profile_image(clean_username)
-            except:
+                    image_data = await download_profile_image(clean_username, session)
+            except Exception:
                 # If direct method fails, try the more complex method
                 print(f"Direct method failed, trying backup method...")
-                image_data = download_profile_image(clean_username)
-
-            if image_data:
-                # Save as rounded PNG
-                output_path = os.path.join(output_dir, f"{clean_username}.png")
-                if make_rounded_image(image_data, output_path):
-                    print(f"✅ Successfully saved {output_path}")
-                    successful += 1
-                else:
-                    print(f"❌ Failed to process image for @{clean_username}")
-                    failed += 1
-            else:
-                print(f"❌ Failed to download image for @{clean_username}")
-                failed += 1
+                image_data = await download_profile_image(clean_username, session)
+
+            if not image_data:
+                return False, f"Failed to download image for @{clean_username}"
+
+            # Save as rounded PNG
+            output_path = os.path.join(output_dir, f"{clean_username}.png")
+            # Pillow is synchronous, so keep it off the event loop
+            saved = await asyncio.get_running_loop().run_in_executor(
+                None, make_rounded_image, image_data, output_path, compress_level
+            )
+            if not saved:
+                return False, f"Failed to process image for @{clean_username}"
+
+            print(f"✅ Successfully saved {output_path}")
+            return True, None
+        except Exception as e:
+            return False, f"Error processing @{clean_username}: {e}"
 
-            # Add a small delay to avoid rate limiting
-            time.sleep(1)
 
-        except Exception as e:
-            print(f"❌ Error processing @{clean_username}: {e}")
+async def main_async(usernames, output_dir, compress_level=1):
+    """Download every username concurrently over one pooled session, returning their results in order."""
+    rate_limit = asyncio.Semaphore(RATE_LIMIT_PER_SECOND)
+    concurrency = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=TIMEOUT, connector=connector) as session:
+        return await asyncio.gather(
+            *[fetch_and_save(u, output_dir, session, rate_limit, concurrency, compress_level) for u in usernames]
+        )
+
+
+def process_usernames(input_file, output_dir, compress_level=1):
+    """Process each username in the input file."""
+    # Create output directory if it doesn't exist
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Read usernames from file, normalising and deduplicating them in order so entries
+    # like @jack, @Jack and twitter.com/jack never race to write the same output file
+    usernames = {}
+    with open(input_file, 'r') as file:
+        for line in file:
+            if line.strip():
+                username = extract_username(line.strip())
+                usernames.setdefault(username.lower(), username)
+    usernames = list(usernames.values())
+
+    successful = 0
+    failed = 0
+
+    # Downloads are latency bound, so overlap them on one event loop
+    for succeeded, error in asyncio.run(main_async(usernames, output_dir, compress_level)):
+        if succeeded:
+            successful += 1
+        else:
+            print(f"❌ {error}")
             failed += 1
 
     print(f"\nProcessing complete. {successful} successful, {failed} failed.")
@@ -201,6 +258,8 @@ def main():
     parser = argparse.ArgumentParser(description='Download Twitter profile images and convert to rounded PNGs')
     parser.add_argument('--input', '-i', required=True, help='Input file containing Twitter usernames')
     parser.add_argument('--output', '-o', default='profile_images', help='Output directory for profile images')
+    parser.add_argument('--compress-level', type=int, default=1, choices=range(10),
+                        help='PNG zlib compression level (0-9); higher is smaller but slower')
 
     args = parser.parse_args()
 
@@ -210,8 +269,8 @@ def main():
     print(f"Output directory: {args.output}")
     print("=" * 50)
 
-    process_usernames(args.input, args.output)
+    process_usernames(args.input, args.output, args.compress_level)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file